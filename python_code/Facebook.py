@@ -5,6 +5,8 @@
 # How to run? - Just run the script as it is without any arguments at runtime. i.e. python Facebook.py 
 # ---- PYTHON LIBRARIES ----
 import urllib.request
+import urllib.error
+import http.client
 import json
 import datetime
 import csv
@@ -13,6 +15,15 @@ import re
 import os
 global acc_name, fan_count
 
+# -- Patterns used on every post, compiled once --
+HASHTAG_RE = re.compile(r'\B#\w+')
+URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+# -- Retry settings for Graph API calls --
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+THROTTLING_CODES = (4, 17, 32, 613)     # Graph API rate limits, sent as HTTP 400/403
+MAX_BACKOFF = 300                       # seconds
+
 # ------ -------
 
 
@@ -55,20 +66,44 @@ def get_FB_Page_Details(page_id,access_token):
 
 #--- Funtion to check if requested URL exists --
 
+def is_transient_error(e):
+    if e.code in TRANSIENT_STATUSES:
+        return True
+    if e.code in (400, 403):
+        # throttling comes back as 400/403, the Graph error code in the body tells it apart
+        # from permanent errors such as 190 (bad token) or 803 (bad page id)
+        try:
+            error = json.loads(e.read()).get('error', {})
+        except ValueError:
+            return False
+        return error.get('code') in THROTTLING_CODES or error.get('is_transient') is True
+    return False
+
+
+def wait_before_retry(url, reason, delay, retry_after=None):
+    # back off exponentially, honouring a numeric Retry-After; both capped at MAX_BACKOFF
+    wait = min(int(retry_after) if retry_after and retry_after.isdigit() else delay, MAX_BACKOFF)
+    print("%s for URL %s, retrying in %ss: %s" % (reason, url.split('?')[0], wait, datetime.datetime.now()))
+    time.sleep(wait)
+    return min(delay * 2, MAX_BACKOFF)
+
+
 def request_until_succeed(url):
+    # transient errors are retried until they clear; permanent ones are raised to the caller
     req = urllib.request.Request(url)
-    success = False
-    while success is False:
+    delay = 5
+    while True:
         try: 
-            response = urllib.request.urlopen(req)
-            if response.getcode() == 200:
-                success = True
-        except Exception as e:
-            time.sleep(5)
-            
-            #print("Error for URL %s: %s" % (url, datetime.datetime.now()))
-
-    return response.read().decode('utf-8')
+            with urllib.request.urlopen(req) as response:
+                return response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            if not is_transient_error(e):
+                raise
+            retry_after = e.headers.get('Retry-After') if e.code in (429, 503) else None
+            delay = wait_before_retry(url, "HTTP %s" % e.code, delay, retry_after)
+        except (OSError, http.client.HTTPException) as e:
+            # flaky connections (URLError, timeouts, BadStatusLine, IncompleteRead)
+            delay = wait_before_retry(url, type(e).__name__, delay)
 
 
 
@@ -104,14 +139,14 @@ def get_FB_Page_Post_Data(page_id,account, page_likes, status):
     s = status_id.split('_')
     post_url = "https://www.facebook.com/"+page_id+"/posts/"+s[1]
 
-    status_message = '' if 'message' not in status.keys() else status['message'].encode('utf-8')
-    status_message1 = '' if 'message' not in status.keys() else status['message']
-    link_name = '' if 'name' not in status.keys() else status['name'].encode('utf-8')
+    status_message = '' if 'message' not in status else status['message'].encode('utf-8')
+    status_message1 = '' if 'message' not in status else status['message']
+    link_name = '' if 'name' not in status else status['name'].encode('utf-8')
     status_type = status['type']
     
     
-    location = 0 if 'place' not in status.keys() else 1
-    messagetags = '' if 'message_tags' not in status.keys() else status['message_tags']
+    location = 0 if 'place' not in status else 1
+    messagetags = '' if 'message_tags' not in status else status['message_tags']
     
     tags = []
     if len(messagetags)>0:
@@ -128,14 +163,13 @@ def get_FB_Page_Post_Data(page_id,account, page_likes, status):
     with_people = len(tags)
 
     #get hashtags from status
-    x =  re.compile(r'\B#\w+')
-    hashtags = len(x.findall(status_message1))
-    hashtag_list = x.findall(status_message1)
+    hashtag_list = HASHTAG_RE.findall(status_message1)
+    hashtags = len(hashtag_list)
     hashtag_text = ' '.join(hashtag_list)
     
 
     #get Links from status
-    urls = re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', status_message1)
+    urls = URL_RE.findall(status_message1)
     links = []
     for url in urls:
         links.append(url)
@@ -174,14 +208,14 @@ def get_FB_Page_Post_Data(page_id,account, page_likes, status):
     status_published = status_published.strftime('%Y-%m-%d %H:%M:%S') # best time format for spreadsheet programs
     
     
-    num_likes = 0 if 'likes' not in status.keys() else status['likes']['summary']['total_count']
-    num_loves = 0 if 'love' not in status.keys() else status['love']['summary']['total_count']
-    num_haha = 0 if 'haha' not in status.keys() else status['haha']['summary']['total_count']
-    num_wow = 0 if 'wow' not in status.keys() else status['wow']['summary']['total_count']
-    num_sad = 0 if 'sad' not in status.keys() else status['sad']['summary']['total_count']
-    num_angry = 0 if 'angry' not in status.keys() else status['angry']['summary']['total_count']
-    num_comments = 0 if 'comments' not in status.keys() else status['comments']['summary']['total_count']
-    num_shares = 0 if 'shares' not in status.keys() else status['shares']['count']
+    num_likes = 0 if 'likes' not in status else status['likes']['summary']['total_count']
+    num_loves = 0 if 'love' not in status else status['love']['summary']['total_count']
+    num_haha = 0 if 'haha' not in status else status['haha']['summary']['total_count']
+    num_wow = 0 if 'wow' not in status else status['wow']['summary']['total_count']
+    num_sad = 0 if 'sad' not in status else status['sad']['summary']['total_count']
+    num_angry = 0 if 'angry' not in status else status['angry']['summary']['total_count']
+    num_comments = 0 if 'comments' not in status else status['comments']['summary']['total_count']
+    num_shares = 0 if 'shares' not in status else status['shares']['count']
 
     # return a tuple of all processed data
     return (account,page_likes, status_id, post_url, data_collected_time, status_published,
@@ -200,7 +234,12 @@ def get_FB_Page_Posts(page_id,access_token):
                     has_next_page = True
                     num_processed = 0   # keep a count on how many we've processed
                     script_starttime = datetime.datetime.now()
-                    statuses = get_FB_Page_Post_Details(i, access_token, 30)    #here 4 means 4 posts can be fetched at a time
+                    try:
+                        statuses = get_FB_Page_Post_Details(i, access_token, 30)    #here 4 means 4 posts can be fetched at a time
+                    except urllib.error.HTTPError as e:
+                        # permanent error for this page (e.g. bad page id) - skip it, keep collecting the rest
+                        print("Skipping page %s (HTTP %s): %s" % (i, e.code, datetime.datetime.now()))
+                        continue
                     flag = 0
                     with open('facebook_details.csv', 'a', newline='') as file:
                         w = csv.writer(file)